@@ -0,0 +1,274 @@
+import sys
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("flask")
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "tools" / "docling-api"))
+
+import docling_price_tables_extraction_api_server as api
+
+BORN_DIGITAL_PDF = Path("./tests/data/pdf/price_tables_born_digital.pdf")
+
+
+class _FakeConverter:
+    """Stands in for Docling: counts conversions and fails on request."""
+
+    def __init__(self, fail_on=()):
+        self.converted = []
+        self.fail_on = set(fail_on)
+
+    def convert(self, source):
+        self.converted.append(source.name)
+        if source.name in self.fail_on:
+            raise RuntimeError(f"cannot convert {source.name}")
+        return _FakeConversion(source.stream.read().decode())
+
+
+class _FakeConversion:
+    def __init__(self, text):
+        self.document = _FakeDocument(text)
+
+
+class _FakeDocument:
+    def __init__(self, text):
+        self.text = text
+
+    def export_to_text(self):
+        return self.text
+
+    def export_to_markdown(self):
+        return self.text
+
+    def export_to_html(self):
+        return f"<p>{self.text}</p>"
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    api._result_cache.clear()
+    api._result_cache_bytes = 0
+    yield
+    api._result_cache.clear()
+    api._result_cache_bytes = 0
+
+
+@pytest.fixture
+def converter(monkeypatch):
+    fake = _FakeConverter()
+    monkeypatch.setattr(api, "_get_converter", lambda: fake)
+    return fake
+
+
+def _post(url, files):
+    client = api.app.test_client()
+    data = {"files": [(BytesIO(content), name) for name, content in files]}
+    return client.post(url, data=data, content_type="multipart/form-data")
+
+
+def test_text_layer_rows_are_split_into_cells():
+    text = api.extract_text_layer(BORN_DIGITAL_PDF.read_bytes())
+
+    assert "3.0TD | > 15 kW | 0,052423 | 0,027250 |" in text
+
+
+def test_born_digital_pdf_skips_converter(converter):
+    pdf = BORN_DIGITAL_PDF.read_bytes()
+
+    response = _post("/extract-price-tables", [("tarifas.pdf", pdf)])
+
+    assert response.status_code == 200
+    assert converter.converted == []
+    tables = response.get_json()["results"][0]["extracted_tables"]
+    potencia = tables["termino_de_potencia"]["tabla_precio_potencia"]["tarifas"]
+    assert potencia[1]["P1"] == pytest.approx(0.052423)
+    assert potencia[1]["P6"] == pytest.approx(0.004231)
+
+    # Text-layer outcomes are cached apart from Docling outcomes
+    assert len(api._result_cache) == 1
+    (cache_key,) = api._result_cache
+    assert cache_key[-1] == api.TEXT_LAYER_CACHE_TAG
+
+    response = _post("/extract-price-tables", [("again.pdf", pdf)])
+    assert response.get_json()["results"][0]["fileName"] == "again.pdf"
+    assert converter.converted == []
+
+
+def _tables(*rows):
+    return {"termino_de_potencia": {"tabla_precio_potencia": {"tarifas": list(rows)}}}
+
+
+def _row(*prices):
+    return dict(zip(("P1", "P2", "P3", "P4", "P5", "P6"), prices))
+
+
+def test_text_layer_acceptance_requires_aligned_prices():
+    assert api._has_aligned_price_rows(_tables(_row(0.1, 0.2, 0.3, 0.4, 0.5, 0.6)))
+    assert api._has_aligned_price_rows(
+        _tables(
+            _row(0.1, 0.2, None, None, None, None), _row(0.1, 0.2, 0.3, 0.4, 0.5, 0.6)
+        )
+    )
+    # No row with all six prices
+    assert not api._has_aligned_price_rows(
+        _tables(_row(0.1, 0.2, None, None, None, None))
+    )
+    # Text in a price column means the cells were misaligned
+    assert not api._has_aligned_price_rows(
+        _tables(_row(0.1, 0.2, 0.3, 0.4, 0.5, 0.6), _row("kW", 0.2, 0.3, 0.4, 0.5, 0.6))
+    )
+    assert not api._has_aligned_price_rows({})
+
+
+def _zip(members):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, content in members:
+            zf.writestr(name, content)
+    return buffer.getvalue()
+
+
+def _names(items):
+    return [item["fileName"] for item in items]
+
+
+def test_uploads_keep_upload_and_archive_order(converter):
+    files = [
+        ("a.pdf", b"first"),
+        ("notes.txt", b"text"),
+        ("batch.zip", _zip([("in/x.pdf", b"x"), ("readme.txt", b""), ("y.pdf", b"y")])),
+        ("empty.zip", _zip([("readme.txt", b"")])),
+        ("broken.zip", b"not a zip"),
+        ("b.pdf", b"last"),
+    ]
+
+    payload = _post("/extract-generic", files).get_json()
+
+    assert _names(payload["results"]) == ["a.pdf", "x.pdf", "y.pdf", "b.pdf"]
+    assert [r["exports"]["text"] for r in payload["results"]] == [
+        "first",
+        "x",
+        "y",
+        "last",
+    ]
+    assert _names(payload["errors"]) == ["notes.txt", "empty.zip", "broken.zip"]
+    assert payload["errors"][0]["error"] == "File type not allowed."
+    assert payload["errors"][1]["error"] == "ZIP does not contain any PDF files."
+    assert payload["errors"][2]["error"].startswith("Processing error:")
+
+
+def test_failed_zip_member_is_reported_in_archive_order(converter):
+    converter.fail_on.add("bad.pdf")
+    files = [
+        (
+            "batch.zip",
+            _zip([("ok.pdf", b"ok"), ("bad.pdf", b"bad"), ("last.pdf", b"last")]),
+        )
+    ]
+
+    payload = _post("/extract-generic", files).get_json()
+
+    assert _names(payload["results"]) == ["ok.pdf", "last.pdf"]
+    assert payload["errors"] == [
+        {"fileName": "bad.pdf", "error": "Processing error: cannot convert bad.pdf"}
+    ]
+
+
+def test_duplicate_pdfs_are_converted_once(converter):
+    files = [
+        ("one.pdf", b"same"),
+        ("batch.zip", _zip([("two.pdf", b"same")])),
+        ("three.pdf", b"same"),
+    ]
+
+    payload = _post("/extract-generic", files).get_json()
+
+    assert len(converter.converted) == 1
+    assert _names(payload["results"]) == ["one.pdf", "two.pdf", "three.pdf"]
+    assert {r["exports"]["text"] for r in payload["results"]} == {"same"}
+
+
+def test_duplicate_pdfs_share_conversion_errors(converter):
+    converter.fail_on.add("one.pdf")
+
+    payload = _post(
+        "/extract-generic", [("one.pdf", b"same"), ("two.pdf", b"same")]
+    ).get_json()
+
+    assert converter.converted == ["one.pdf"]
+    assert payload["results"] == []
+    assert payload["errors"] == [
+        {"fileName": "one.pdf", "error": "Processing error: cannot convert one.pdf"},
+        {"fileName": "two.pdf", "error": "Processing error: cannot convert one.pdf"},
+    ]
+    # Processing errors are not cached
+    assert len(api._result_cache) == 0
+
+
+def _outcome(name, text=""):
+    return {"fileName": name, "extracted_tables": {}, "exports": {"text": text}}, None
+
+
+def _cached_bytes():
+    return sum(size for _, size in api._result_cache.values())
+
+
+def test_result_cache_evicts_least_recently_used_by_count(monkeypatch):
+    monkeypatch.setattr(api, "RESULT_CACHE_SIZE", 2)
+    api._cache_put("a", _outcome("a.pdf"))
+    api._cache_put("b", _outcome("b.pdf"))
+    assert api._cache_get("a") is not None
+
+    api._cache_put("c", _outcome("c.pdf"))
+
+    assert list(api._result_cache) == ["a", "c"]
+    assert api._cache_get("b") is None
+    assert api._result_cache_bytes == _cached_bytes()
+
+
+def test_result_cache_evicts_by_approximate_bytes(monkeypatch):
+    entry_size = api._outcome_size(_outcome("a.pdf", "x" * 1000))
+    monkeypatch.setattr(api, "RESULT_CACHE_MAX_BYTES", 3 * entry_size)
+    for key in "abcd":
+        api._cache_put(key, _outcome(f"{key}.pdf", "x" * 1000))
+
+    assert list(api._result_cache) == ["b", "c", "d"]
+    assert api._result_cache_bytes == 3 * entry_size == _cached_bytes()
+
+
+def test_result_cache_reput_does_not_drift():
+    api._cache_put("a", _outcome("a.pdf", "x" * 1000))
+    api._cache_put("b", _outcome("b.pdf"))
+    api._cache_put("a", _outcome("a.pdf", "x" * 10))
+
+    assert list(api._result_cache) == ["b", "a"]
+    assert api._result_cache_bytes == _cached_bytes()
+    assert api._result_cache_bytes == 2 * api._outcome_size(_outcome("b.pdf")) + 10
+
+
+def test_result_cache_skips_outcomes_over_budget(monkeypatch):
+    monkeypatch.setattr(api, "RESULT_CACHE_MAX_BYTES", 10_000)
+    api._cache_put("small", _outcome("small.pdf"))
+
+    api._cache_put("large", _outcome("large.pdf", "x" * 10_000))
+
+    assert list(api._result_cache) == ["small"]
+    assert api._result_cache_bytes == _cached_bytes()
+
+
+def test_cache_hit_is_relabelled_without_changing_entry():
+    api._cache_put("a", _outcome("first.pdf", "text"))
+    api._cache_put("e", (None, {"fileName": "first.pdf", "error": "Could not extract"}))
+
+    result, error = api._with_file_name(api._cache_get("a"), "second.pdf")
+    assert error is None
+    assert result == {**_outcome("first.pdf", "text")[0], "fileName": "second.pdf"}
+    result, error = api._with_file_name(api._cache_get("e"), "second.pdf")
+    assert result is None
+    assert error == {"fileName": "second.pdf", "error": "Could not extract"}
+
+    assert api._cache_get("a")[0]["fileName"] == "first.pdf"
+    assert api._cache_get("e")[1]["fileName"] == "first.pdf"
@@ -6,18 +6,30 @@ This script creates a Flask API server focused on extracting price tables
 from PDF documents via Docling.
 """
 
+import io
 import os
 import json
-import tempfile
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import zipfile
-import uuid
 from flask import Response
 from flask import Flask, request, jsonify
 import logging
+import pypdfium2 as pdfium
 from werkzeug.utils import secure_filename
+from docling.datamodel.base_models import DocumentStream
 from docling.document_converter import DocumentConverter
+from docling.utils.locks import pypdfium2_lock
 from price_table_extraction import extract_price_tables_from_text
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -25,10 +37,98 @@ logger = logging.getLogger(__name__)
 app.config['JSON_AS_ASCII'] = False
 
 # Configuration
-UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'pdf', 'zip'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
+# Max size per PDF. Direct uploads are already capped by MAX_CONTENT_LENGTH, so in practice this
+# bounds the decompressed size of each ZIP member
+app.config['MAX_FILE_SIZE'] = 16 * 1024 * 1024
+app.config['MAX_ZIP_TOTAL_SIZE'] = 64 * 1024 * 1024  # 64MB max decompressed PDFs per ZIP
+READ_CHUNK_SIZE = 64 * 1024
+# Optional /extract-generic exports -> DoclingDocument exporter method
+OPTIONAL_EXPORTS = {'markdown': 'export_to_markdown', 'html': 'export_to_html'}
+# Non-whitespace characters on the first page above which a PDF is treated as born-digital
+MIN_TEXT_LAYER_CHARS = 200
+# Result cache key suffix of outcomes parsed from a PDF's own text layer instead of Docling
+TEXT_LAYER_CACHE_TAG = 'text-layer'
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))  # processed files kept in memory
+# Approximate memory bound for the result cache; generic results carry full document exports
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+# Pipeline stage pools: unzip (I/O) -> Docling conversion (OCR) -> text export + parsing (CPU).
+# Separate pools keep I/O and parsing from queueing behind OCR. Threads (not processes) so
+# the cached converter and its loaded models are shared.
+# Conversions are submitted one document per task: with Docling's default doc_batch_size of 1,
+# convert_all() runs a batch sequentially, so coalescing documents would only serialize them.
+_io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='docling-io')
+_ocr_executor = ThreadPoolExecutor(max_workers=min(os.cpu_count() or 1, 8), thread_name_prefix='docling-ocr')
+_cpu_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='docling-parse')
+
+_converter_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _build_converter():
+    """Build the DocumentConverter once; model loading dominates latency."""
+    return DocumentConverter()
+
+
+def _get_converter():
+    """Return the process-wide shared DocumentConverter."""
+    # Serialize the first construction so concurrent requests don't load the models twice
+    with _converter_lock:
+        return _build_converter()
+
+
+# Content-addressed LRU cache of per-file outcomes, keyed by (processor name, sha1 of the PDF).
+# Entries are stored as (outcome, approximate size in bytes).
+_result_cache = OrderedDict()
+_result_cache_bytes = 0
+_result_cache_lock = threading.Lock()
+
+
+def _outcome_size(outcome):
+    """Rough memory footprint of an outcome, dominated by the text/markdown/HTML exports."""
+    result, _ = outcome
+    exports = (result or {}).get('exports') or {}
+    return 4096 + sum(len(value) for value in exports.values() if isinstance(value, str))
+
+
+def _cache_get(cache_key):
+    """Return the cached (result, error) outcome for cache_key, or None."""
+    with _result_cache_lock:
+        entry = _result_cache.get(cache_key)
+        if entry is None:
+            return None
+        _result_cache.move_to_end(cache_key)
+        return entry[0]
+
+
+def _cache_put(cache_key, outcome):
+    """Store a (result, error) outcome, evicting the least recently used entries."""
+    global _result_cache_bytes
+    size = _outcome_size(outcome)
+    if size > RESULT_CACHE_MAX_BYTES:
+        return
+    with _result_cache_lock:
+        previous = _result_cache.pop(cache_key, None)
+        if previous is not None:
+            _result_cache_bytes -= previous[1]
+        _result_cache[cache_key] = (outcome, size)
+        _result_cache_bytes += size
+        while len(_result_cache) > RESULT_CACHE_SIZE or _result_cache_bytes > RESULT_CACHE_MAX_BYTES:
+            _, (_, evicted_size) = _result_cache.popitem(last=False)
+            _result_cache_bytes -= evicted_size
+
+
+def _with_file_name(outcome, name):
+    """Re-label a cached outcome with the file name of the current upload."""
+    result, error = outcome
+    if result is not None:
+        result = {**result, 'fileName': name}
+    if error is not None:
+        error = {**error, 'fileName': name}
+    return result, error
 
 
 def allowed_file(filename):
@@ -38,22 +138,28 @@ def allowed_file(filename):
 
 def json_response(payload, status=200):
     """Return a Response with UTF-8 JSON (no ASCII escaping)."""
-    return Response(json.dumps(payload, ensure_ascii=False), status=status, mimetype='application/json')
+    # orjson is much faster on large /extract-generic payloads and always emits UTF-8
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, ensure_ascii=False)
+    return Response(body, status=status, mimetype='application/json')
+
 
+def export_document_payload(document, include=OPTIONAL_EXPORTS):
+    """
+    Export multiple representations from a Docling document safely.
 
-def export_document_payload(document):
-    """Export multiple representations from a Docling document safely."""
+    Text is always exported; each optional export in include costs a full document walk.
+    """
     exports = {}
     try:
         exports["text"] = document.export_to_text()
     except Exception:
         exports["text"] = None
 
-    for method_name, export_key in [
-        ("export_to_markdown", "markdown"),
-        ("export_to_html", "html"),
-    ]:
-        exporter = getattr(document, method_name, None)
+    for export_key in include:
+        exporter = getattr(document, OPTIONAL_EXPORTS[export_key], None)
         if exporter:
             try:
                 exports[export_key] = exporter()
@@ -73,6 +179,330 @@ def health_check():
     })
 
 
+def get_uploaded_files():
+    """Gather uploaded files (support both 'files' and legacy 'file')."""
+    if 'files' in request.files:
+        return request.files.getlist('files')
+    if 'file' in request.files:
+        return [request.files['file']]
+    return []
+
+
+def _has_any_tarifas(tables):
+    """Validate new schema: consider success if any tarifas list is non-empty."""
+    potencia = tables.get('termino_de_potencia', {})
+    energia = tables.get('termino_de_energia', {})
+    return bool(
+        potencia.get('tabla_precio_potencia', {}).get('tarifas')
+        or energia.get('tabla_precio_clasica_base', {}).get('tarifas')
+        or energia.get('tabla_precio_clasica_unica', {}).get('tarifas')
+    )
+
+
+def _has_aligned_price_rows(tables):
+    """Check that a text-layer parse came out column-aligned before it is trusted.
+
+    A potencia or clasica base row must have a numeric price in every P1..P6 column, and no
+    price column of those tables may hold text, which is what misaligned cells look like.
+    """
+    complete = False
+    for table in (
+        tables.get('termino_de_potencia', {}).get('tabla_precio_potencia', {}),
+        tables.get('termino_de_energia', {}).get('tabla_precio_clasica_base', {}),
+    ):
+        for row in table.get('tarifas') or ():
+            prices = [row.get(k) for k in ('P1', 'P2', 'P3', 'P4', 'P5', 'P6')]
+            if any(p is not None and not isinstance(p, float) for p in prices):
+                return False
+            complete = complete or all(isinstance(p, float) for p in prices)
+    return complete
+
+
+def process_price_tables_document(document, name):
+    """Extract price tables from a converted document. Returns (result, error)."""
+    text = document.export_to_text()
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug(f"--- OCR Extracted Text ({name}) ---\n{text}\n--------------------------")
+    return process_price_tables_text(text, name)
+
+
+def process_price_tables_text(text, name):
+    """Extract price tables from document text. Returns (result, error)."""
+    # Extract tables
+    tables = extract_price_tables_from_text(text)
+
+    if not tables or not _has_any_tarifas(tables):
+        return None, {'fileName': name, 'error': 'Could not extract any price tables from the document.'}
+    return {'fileName': name, 'extracted_tables': tables}, None
+
+
+def process_generic_document(document, name, include=OPTIONAL_EXPORTS):
+    """Return the raw exports of a converted document plus parsed tables. Returns (result, error)."""
+    exports = export_document_payload(document, include)
+    text = exports.get("text") or ""
+    tables = extract_price_tables_from_text(text) if text else {}
+    return {
+        'fileName': name,
+        'extracted_tables': tables,
+        'exports': exports,
+    }, None
+
+
+def _rows_to_text(boxes):
+    """
+    Rebuild the lines of a page from PDFium text rects [(left, bottom, right, top, text)].
+
+    PDFium's plain text separates table cells with single spaces, which the parser cannot
+    split, so rects on the same line are joined with ' | ' like Docling's table exports.
+    Rects closer than half the line height are treated as fragments of the same cell.
+    """
+    lines = []
+    row = []
+    # PDF y coordinates grow upwards: walk the rects top to bottom
+    for box in sorted(boxes, key=lambda b: -b[3]):
+        if row and not row[0][1] <= (box[1] + box[3]) / 2 <= row[0][3]:
+            lines.append(row)
+            row = []
+        row.append(box)
+    if row:
+        lines.append(row)
+
+    text_lines = []
+    for row in lines:
+        row.sort()
+        cells = [row[0][4]]
+        for (_, bottom, right, top, _), (left, _, _, _, text) in zip(row, row[1:]):
+            if left - right <= (top - bottom) / 2:
+                cells[-1] += ' ' + text
+            else:
+                cells.append(text)
+        text_lines.append(' | '.join(cells))
+    return '\n'.join(text_lines)
+
+
+def extract_text_layer(data):
+    """
+    Return the embedded text of a born-digital PDF, or None when it looks scanned.
+
+    Only the first page is probed before extracting the rest.
+    """
+    # PDFium is not thread-safe; share Docling's lock since conversions run concurrently.
+    # The lock is taken per page so running conversions are not stalled behind a whole document.
+    with pypdfium2_lock:
+        pdf = pdfium.PdfDocument(data)
+        n_pages = len(pdf)
+    try:
+        pages = []
+        for index in range(n_pages):
+            with pypdfium2_lock:
+                page = pdf[index]
+                textpage = page.get_textpage()
+                boxes = []
+                for i in range(textpage.count_rects()):
+                    rect = textpage.get_rect(i)
+                    text = textpage.get_text_bounded(*rect).strip()
+                    if text:
+                        boxes.append((*rect, text))
+                textpage.close()
+                page.close()
+            if index == 0 and sum(len(''.join(box[4].split())) for box in boxes) <= MIN_TEXT_LAYER_CHARS:
+                return None
+            pages.append(_rows_to_text(boxes))
+    finally:
+        with pypdfium2_lock:
+            pdf.close()
+    return '\n'.join(pages) if pages else None
+
+
+def _process_text_layer(data, name, process_text):
+    """Run process_text on the text layer of a born-digital PDF. Returns (result, error) or None."""
+    try:
+        text = extract_text_layer(data)
+    except Exception as e:
+        app.logger.debug(f"Could not read the text layer of {name}: {e}")
+        return None
+    if text is None:
+        return None
+    outcome = process_text(text, name)
+    # Rows rebuilt from the text layer can still misalign; only accept clean tables, else
+    # let Docling retry
+    result, error = outcome
+    if error is not None or not _has_aligned_price_rows(result['extracted_tables']):
+        return None
+    return outcome
+
+
+def read_limited(stream):
+    """
+    Read a file stream into memory in chunks, hashing it on the way.
+
+    Returns (bytes, sha1 hex digest), or (None, None) as soon as the stream exceeds
+    MAX_FILE_SIZE so oversized files are never fully buffered.
+    """
+    max_size = app.config['MAX_FILE_SIZE']
+    digest = hashlib.sha1()
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            return None, None
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b''.join(chunks), digest.hexdigest()
+
+
+def _convert(data, name):
+    """OCR an in-memory PDF with the shared converter."""
+    source = DocumentStream(name=name, stream=io.BytesIO(data))
+    return _get_converter().convert(source).document
+
+
+def _list_zip(data):
+    """
+    List the PDFs contained in an uploaded ZIP without decompressing them. Returns
+    [(name, ZipInfo)], or None if their declared sizes add up to more than MAX_ZIP_TOTAL_SIZE.
+    """
+    with zipfile.ZipFile(io.BytesIO(data), 'r') as zf:
+        members = [info for info in zf.infolist() if info.filename.lower().endswith('.pdf')]
+    # Reads are capped at the declared sizes, so this bounds what the archive can expand to
+    if sum(info.file_size for info in members) > app.config['MAX_ZIP_TOTAL_SIZE']:
+        return None
+    return [(secure_filename(os.path.basename(info.filename)), info) for info in members]
+
+
+def _read_zip_member(data, info):
+    """Decompress one ZIP member. Returns (bytes, sha1), or (None, None) if it is too large."""
+    with zipfile.ZipFile(io.BytesIO(data), 'r') as zf, zf.open(info) as member:
+        return read_limited(member)
+
+
+def process_uploads(uploaded_files, process_document, cache_tag=None, process_text=None):
+    """
+    Run every uploaded PDF (including PDFs inside ZIPs) through the unzip -> convert -> parse
+    pipeline, finishing each converted document with process_document.
+
+    When process_text is given, born-digital PDFs are first processed from their embedded
+    text layer and only go through Docling if that yields an error.
+
+    cache_tag identifies the processing variant in the result cache (defaults to the name of
+    process_document). Results and errors are returned in upload order, ZIP members in
+    archive order.
+    """
+    if cache_tag is None:
+        cache_tag = process_document.__name__
+
+    # Outcomes are keyed by (upload index,) or (upload index, member index) to keep ordering stable
+    outcomes = {}
+    # future -> (outcome key, file name, stage, result cache key, PDF or ZIP bytes for the next stage)
+    pending = {}
+    # result cache key -> [(outcome key, file name)] of duplicates waiting on an in-flight file
+    duplicates = {}
+
+    def finish(key, cache_key, outcome):
+        outcomes[key] = outcome
+        for dup_key, dup_name in duplicates.pop(cache_key, ()):
+            outcomes[dup_key] = _with_file_name(outcome, dup_name)
+
+    def schedule_pdf(key, name, data, digest):
+        # Files seen before, or already being processed in this request, skip OCR and parsing
+        cache_key = (cache_tag, digest)
+        cached = _cache_get(cache_key)
+        if cached is None and process_text is not None:
+            cached = _cache_get(cache_key + (TEXT_LAYER_CACHE_TAG,))
+        if cached is not None:
+            app.logger.debug(f"Cache hit for {name} (sha1 {digest})")
+            outcomes[key] = _with_file_name(cached, name)
+        elif cache_key in duplicates:
+            duplicates[cache_key].append((key, name))
+        else:
+            duplicates[cache_key] = []
+            if process_text is not None:
+                future = _cpu_executor.submit(_process_text_layer, data, name, process_text)
+                pending[future] = (key, name, 'probe', cache_key, data)
+            else:
+                pending[_ocr_executor.submit(_convert, data, name)] = (key, name, 'convert', cache_key, None)
+
+    for i, file in enumerate(uploaded_files):
+        if file.filename == '':
+            outcomes[(i,)] = (None, {'fileName': '', 'error': 'Empty filename.'})
+            continue
+
+        if not allowed_file(file.filename):
+            outcomes[(i,)] = (None, {'fileName': file.filename, 'error': 'File type not allowed.'})
+            continue
+
+        filename = secure_filename(file.filename)
+
+        # Keep the upload in memory; the stream is only readable within the request
+        data, digest = read_limited(file.stream)
+        if data is None:
+            outcomes[(i,)] = (None, {'fileName': filename, 'error': 'File too large.'})
+            continue
+        app.logger.debug(f"Received {filename} ({len(data)} bytes, sha1 {digest})")
+
+        if filename.lower().endswith('.zip'):
+            pending[_io_executor.submit(_list_zip, data)] = ((i,), filename, 'unzip', None, data)
+        else:
+            schedule_pdf((i,), filename, data, digest)
+
+    # Aggregator: advance each file to its next stage as soon as the previous one completes
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            key, name, stage, cache_key, data = pending.pop(future)
+            try:
+                value = future.result()
+            except Exception as e:
+                app.logger.error(f"Error processing {name}: {e}")
+                finish(key, cache_key, (None, {'fileName': name, 'error': f'Processing error: {str(e)}'}))
+                continue
+
+            if stage == 'unzip':
+                if value is None:
+                    outcomes[key] = (None, {'fileName': name, 'error': 'ZIP contents too large.'})
+                elif not value:
+                    outcomes[key] = (None, {'fileName': name, 'error': 'ZIP does not contain any PDF files.'})
+                else:
+                    # Members are decompressed one task each and enter the pipeline as they are read
+                    for j, (inner_filename, info) in enumerate(value):
+                        future = _io_executor.submit(_read_zip_member, data, info)
+                        pending[future] = (key + (j,), inner_filename, 'read', None, None)
+            elif stage == 'read':
+                inner_data, digest = value
+                if inner_data is None:
+                    outcomes[key] = (None, {'fileName': name, 'error': 'File too large.'})
+                else:
+                    app.logger.debug(f"Extracted {name} ({len(inner_data)} bytes, sha1 {digest})")
+                    schedule_pdf(key, name, inner_data, digest)
+            elif stage == 'probe' and value is None:
+                # Scanned PDF (or unusable text layer): OCR it with Docling
+                pending[_ocr_executor.submit(_convert, data, name)] = (key, name, 'convert', cache_key, None)
+            elif stage == 'probe':
+                # Text-layer outcomes are cached apart from Docling ones so they can be told apart
+                _cache_put(cache_key + (TEXT_LAYER_CACHE_TAG,), value)
+                finish(key, cache_key, value)
+            elif stage == 'convert':
+                pending[_cpu_executor.submit(process_document, value, name)] = (key, name, 'parse', cache_key, None)
+            else:
+                # Only completed outcomes are cached; processing errors may be transient
+                _cache_put(cache_key, value)
+                finish(key, cache_key, value)
+
+    results = []
+    errors = []
+    for key in sorted(outcomes):
+        result, error = outcomes[key]
+        if error is not None:
+            errors.append(error)
+        else:
+            results.append(result)
+    return results, errors
+
+
 @app.route('/extract-price-tables', methods=['POST'])
 def extract_price_tables():
     """
@@ -98,124 +528,13 @@ def extract_price_tables():
         ]
     }
     """
-
-    # Gather uploaded files (support both 'files' and legacy 'file')
-    uploaded_files = []
-    if 'files' in request.files:
-        uploaded_files = request.files.getlist('files')
-    elif 'file' in request.files:
-        uploaded_files = [request.files['file']]
-
+    uploaded_files = get_uploaded_files()
     if not uploaded_files:
         return jsonify({'success': False, 'error': 'No file(s) provided in the request.'}), 400
 
-    results = []
-    errors = []
-
-    for file in uploaded_files:
-        if file.filename == '':
-            errors.append({'fileName': '', 'error': 'Empty filename.'})
-            continue
-
-        if not allowed_file(file.filename):
-            errors.append({'fileName': file.filename, 'error': 'File type not allowed.'})
-            continue
-
-        filename = secure_filename(file.filename)
-        temp_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-
-        # Persist temporarily
-        file.save(filepath)
-
-        # If the upload is a ZIP, iterate over contained PDFs
-        if filename.lower().endswith('.zip'):
-            try:
-                with zipfile.ZipFile(filepath, 'r') as zf:
-                    pdf_names = [n for n in zf.namelist() if n.lower().endswith('.pdf')]
-                    if not pdf_names:
-                        errors.append({'fileName': filename, 'error': 'ZIP does not contain any PDF files.'})
-                    for inner_name in pdf_names:
-                        inner_filename = secure_filename(os.path.basename(inner_name))
-                        inner_temp = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{inner_filename}")
-                        # Extract to temp file
-                        with open(inner_temp, 'wb') as f_out:
-                            f_out.write(zf.read(inner_name))
-                        try:
-                            converter = DocumentConverter()
-                            result = converter.convert(inner_temp)
-                            text = result.document.export_to_text()
-                            tables = extract_price_tables_from_text(text)
-                            # Validate new schema: consider success if any tarifas list is non-empty
-                            try:
-                                pot = tables.get('termino_de_potencia', {}).get('tabla_precio_potencia', {}).get('tarifas', [])
-                                base = tables.get('termino_de_energia', {}).get('tabla_precio_clasica_base', {}).get('tarifas', [])
-                                unica = tables.get('termino_de_energia', {}).get('tabla_precio_clasica_unica', {}).get('tarifas', [])
-                                has_any = any([pot, base, unica]) and (
-                                    (isinstance(pot, list) and len(pot) > 0) or
-                                    (isinstance(base, list) and len(base) > 0) or
-                                    (isinstance(unica, list) and len(unica) > 0)
-                                )
-                            except Exception:
-                                has_any = False
-                            if not tables or not has_any:
-                                errors.append({'fileName': inner_filename, 'error': 'Could not extract any price tables from the document.'})
-                            else:
-                                results.append({'fileName': inner_filename, 'extracted_tables': tables})
-                        except Exception as e:
-                            app.logger.error(f"Error processing {inner_filename}: {e}")
-                            errors.append({'fileName': inner_filename, 'error': f'Processing error: {str(e)}'})
-                        finally:
-                            try:
-                                os.remove(inner_temp)
-                            except Exception:
-                                pass
-            finally:
-                # remove uploaded zip
-                try:
-                    os.remove(filepath)
-                except Exception:
-                    pass
-            # Skip normal PDF processing for ZIP file
-            continue
-
-        try:
-            # OCR the document (regular single PDF case)
-            converter = DocumentConverter()
-            result = converter.convert(filepath)
-            text = result.document.export_to_text()
-            app.logger.debug(f"--- OCR Extracted Text ({filename}) ---\n{text}\n--------------------------")
-
-            # Extract tables
-            tables = extract_price_tables_from_text(text)
-
-            # Validate new schema: consider success if any tarifas list is non-empty
-            try:
-                pot = tables.get('termino_de_potencia', {}).get('tabla_precio_potencia', {}).get('tarifas', [])
-                base = tables.get('termino_de_energia', {}).get('tabla_precio_clasica_base', {}).get('tarifas', [])
-                unica = tables.get('termino_de_energia', {}).get('tabla_precio_clasica_unica', {}).get('tarifas', [])
-                has_any = any([pot, base, unica]) and (
-                    (isinstance(pot, list) and len(pot) > 0) or
-                    (isinstance(base, list) and len(base) > 0) or
-                    (isinstance(unica, list) and len(unica) > 0)
-                )
-            except Exception:
-                has_any = False
-
-            if not tables or not has_any:
-                errors.append({'fileName': filename, 'error': 'Could not extract any price tables from the document.'})
-            else:
-                results.append({'fileName': filename, 'extracted_tables': tables})
-        except Exception as e:
-            app.logger.error(f"Error processing {filename}: {e}")
-            errors.append({'fileName': filename, 'error': f'Processing error: {str(e)}'})
-        finally:
-            # Always attempt to delete the temporary file
-            try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except Exception as cleanup_e:
-                app.logger.warning(f"Failed to remove temp file {filepath}: {cleanup_e}")
+    # Born-digital PDFs are parsed from their text layer, bypassing Docling OCR
+    results, errors = process_uploads(uploaded_files, process_price_tables_document,
+                                      process_text=process_price_tables_text)
 
     # Build final response
     response_payload = {
@@ -237,84 +556,26 @@ def extract_generic():
     Request format (multipart/form-data):
     • For multiple files  -> field name "files"
     • For single  file    -> field name "file"
-    """
-    uploaded_files = []
-    if 'files' in request.files:
-        uploaded_files = request.files.getlist('files')
-    elif 'file' in request.files:
-        uploaded_files = [request.files['file']]
 
+    Query parameters:
+    • include -> comma-separated optional exports ("markdown", "html"); all of them when
+                 omitted. The text export is always returned.
+    """
+    include = OPTIONAL_EXPORTS
+    if 'include' in request.args:
+        include = tuple(k.strip() for k in request.args['include'].split(',') if k.strip())
+        unknown = [k for k in include if k not in OPTIONAL_EXPORTS]
+        if unknown:
+            return jsonify({'success': False, 'error': f"Unknown export(s): {', '.join(unknown)}."}), 400
+
+    uploaded_files = get_uploaded_files()
     if not uploaded_files:
         return jsonify({'success': False, 'error': 'No file(s) provided in the request.'}), 400
 
-    results = []
-    errors = []
-
-    def process_pdf(path, name):
-        converter = DocumentConverter()
-        result = converter.convert(path)
-        exports = export_document_payload(result.document)
-        text = exports.get("text") or ""
-        tables = extract_price_tables_from_text(text) if text else {}
-        return {
-            'fileName': name,
-            'extracted_tables': tables,
-            'exports': exports,
-        }
-
-    for file in uploaded_files:
-        if file.filename == '':
-            errors.append({'fileName': '', 'error': 'Empty filename.'})
-            continue
-
-        if not allowed_file(file.filename):
-            errors.append({'fileName': file.filename, 'error': 'File type not allowed.'})
-            continue
-
-        filename = secure_filename(file.filename)
-        temp_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-        file.save(filepath)
-
-        if filename.lower().endswith('.zip'):
-            try:
-                with zipfile.ZipFile(filepath, 'r') as zf:
-                    pdf_names = [n for n in zf.namelist() if n.lower().endswith('.pdf')]
-                    if not pdf_names:
-                        errors.append({'fileName': filename, 'error': 'ZIP does not contain any PDF files.'})
-                    for inner_name in pdf_names:
-                        inner_filename = secure_filename(os.path.basename(inner_name))
-                        inner_temp = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{inner_filename}")
-                        with open(inner_temp, 'wb') as f_out:
-                            f_out.write(zf.read(inner_name))
-                        try:
-                            results.append(process_pdf(inner_temp, inner_filename))
-                        except Exception as e:
-                            app.logger.error(f"Error processing {inner_filename}: {e}")
-                            errors.append({'fileName': inner_filename, 'error': f'Processing error: {str(e)}'})
-                        finally:
-                            try:
-                                os.remove(inner_temp)
-                            except Exception:
-                                pass
-            finally:
-                try:
-                    os.remove(filepath)
-                except Exception:
-                    pass
-            continue
-
-        try:
-            results.append(process_pdf(filepath, filename))
-        except Exception as e:
-            app.logger.error(f"Error processing {filename}: {e}")
-            errors.append({'fileName': filename, 'error': f'Processing error: {str(e)}'})
-        finally:
-            try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except Exception as cleanup_e:
-                app.logger.warning(f"Failed to remove temp file {filepath}: {cleanup_e}")
+    include = tuple(k for k in OPTIONAL_EXPORTS if k in include)
+    results, errors = process_uploads(uploaded_files,
+                                      functools.partial(process_generic_document, include=include),
+                                      cache_tag=('process_generic_document', include))
 
     response_payload = {
         'success': bool(results),
@@ -328,5 +589,7 @@ def extract_generic():
 
 
 if __name__ == '__main__':
+    # Local fallback only; deployments run under gunicorn with threaded workers:
+    #   gunicorn -k gthread -w 2 --threads 8 --bind 0.0.0.0:$PORT docling_price_tables_extraction_api_server:app
     port = int(os.environ.get('PORT', 5010))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
@@ -1,11 +1,74 @@
 import re
 import logging
 import unicodedata
+from itertools import islice, zip_longest
+from operator import methodcaller
 from typing import Optional
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns (applied on normalized text unless noted otherwise)
+_WS_RX = re.compile(r"[ \t]+")
+_TWO_SPACES_RX = re.compile(r"\s{2,}")
+_split_on_pipes = methodcaller('split', '|')
+
+# Cell values meaning "no price" and the translation for '1.234,5' -> '1234.5'
+_EMPTY_CELLS = frozenset(('—', '-', ''))
+_DECIMAL_COMMA_TABLE = str.maketrans({'.': None, ',': '.'})
+
+# Parsed column names and the matching keys of each output tarifa row
+_TARIFA_COLUMNS = ('TARIFA', 'POTENCIA CONTRATADA', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6')
+_TARIFA_KEYS = ('tarifa', 'potencia_contratada', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6')
+
+# Regex patterns tolerant to accents/spacing variants
+_POTENCIA_START_RX = re.compile(r"termino\s+de\s+potencia\s*\(\s*€/?\s*\/??\s*kw\s*y\s*dia\s*\)")
+_POTENCIA_END_RX = re.compile(r"estos\s+precios\s+llevar?n?\s+incluidos")
+_POTENCIA_TITLE_RX = re.compile(r"precio\s+potencia\s*\(\s*€/?\s*kw\s*y\s*dia\s*\)")
+
+# Match TE followed by any single digit (e.g., TE1, TE3)
+_CLASICA_BASE_START_RX = re.compile(r"precio\s+clasica\s+base\s+te\s*\d\s*\(\s*c€/?\s*kwh\s*\)")
+_CLASICA_BASE_END_RX = re.compile(r"precio\s+clasica\s+base\s+te\s*\d\s+unica")
+_CLASICA_BASE_TITLE_RX = re.compile(r"precio\s+clasica\s+base\s+te\s*\d+\s*\(\s*c€/?\s*kwh\s*\)")
+
+_UNICA_START_RX = re.compile(r"precio\s+clasica\s+base\s+te\s*\d\s+unica\s*\(\s*c€/?\s*kwh\s*\)")
+_UNICA_END_RX = re.compile(r"en\s+caso\s+de\s+no\s+marcar\s+la\s+casilla")
+
+# Tariff name patterns, tried on both the original and the normalized header lines.
+# Use more flexible patterns to handle accents and variations
+_TARIFF_PATTERNS = (
+    re.compile(r'tarifa\s+cl[aá]sica\s+te\s*\d+', re.IGNORECASE),
+    re.compile(r'tarifa\s+te\s*\d+', re.IGNORECASE),
+    re.compile(r'cl[aá]sica\s+te\s*\d+', re.IGNORECASE),
+    # Also try without accents (normalized)
+    re.compile(r'tarifa\s+clasica\s+te\s*\d+', re.IGNORECASE),
+)
+_TARIFF_ORIG_RX = re.compile(r'tarifa.*te\s*\d+', re.IGNORECASE)
+
+# Token replacements applied by normalize_text in a single pass ('c€ /' is covered by '€ /')
+_NORM_SUBS = {'€ /': '€/', 'k w': 'kw', '\r\n': '\n', '\r': '\n'}
+_NORM_SUBS_RX = re.compile(r"€ /|k w|\r\n?")
+
+
+class _AccentStripTable(dict):
+    """str.translate table mapping a character to its NFKD form without combining marks.
+
+    Equivalent to NFKD-normalizing the whole string and dropping combining marks, since
+    canonical reordering only moves combining marks. Entries are computed on first use.
+    """
+
+    def __missing__(self, codepoint):
+        nfkd = unicodedata.normalize('NFKD', chr(codepoint))
+        stripped = ''.join(ch for ch in nfkd if not unicodedata.combining(ch))
+        self[codepoint] = stripped
+        return stripped
+
+
+_ACCENT_STRIP_TABLE = _AccentStripTable()
+# Precompute the common Spanish accents
+for _ch in 'áéíóúüñÁÉÍÓÚÜÑ':
+    _ACCENT_STRIP_TABLE[ord(_ch)]
+
 
 def extract_price_tables_from_text(text):
     """
@@ -15,36 +78,38 @@ def extract_price_tables_from_text(text):
     Returns:
         dict: A dictionary containing the extracted tables as dictionaries of lists (columns).
     """
+    # Avoid building debug messages (some dump whole tables) when DEBUG is off
+    debug = logger.isEnabledFor(logging.DEBUG)
+
     # -----------------------------
     # Helpers: normalization & utils
     # -----------------------------
     def strip_accents(s: str) -> str:
         if not isinstance(s, str):
             return s
-        # Normalize and remove combining marks (accents)
-        nfkd = unicodedata.normalize('NFKD', s)
-        return ''.join(ch for ch in nfkd if not unicodedata.combining(ch))
+        # Remove combining marks (accents); ASCII text is already in NFKD form
+        if s.isascii():
+            return s
+        return s.translate(_ACCENT_STRIP_TABLE)
 
     def normalize_text(s: str) -> str:
         if not isinstance(s, str):
             return s
         s = strip_accents(s).lower()
-        # Normalize newlines first (preserve line breaks for row parsing)
-        s = s.replace('\r\n', '\n').replace('\r', '\n')
-        # Unify some punctuation variants and spaces
-        s = s.replace('€ /', '€/').replace('c€ /', 'c€/')
-        s = s.replace('k w', 'kw').replace('kwh', 'kwh')
+        # Normalize newlines (preserve line breaks for row parsing) and unify some
+        # punctuation variants and spaces
+        s = _NORM_SUBS_RX.sub(lambda m: _NORM_SUBS[m.group()], s)
         # Collapse only spaces/tabs, keep newlines
-        s = re.sub(r"[ \t]+", " ", s)
+        s = _WS_RX.sub(" ", s)
         return s
 
-    def clean_and_convert(value):
-        if not isinstance(value, str):
-            return value
+    def clean_and_convert(value: str):
+        # Cells are always strings after splitting
         cleaned_value = value.replace('|', '').strip()
-        if cleaned_value in ['—', '-', '']:
+        if cleaned_value in _EMPTY_CELLS:
             return None
-        standardized_value = cleaned_value.replace('.', '').replace(',', '.')
+        # Drop thousands separators and use '.' as decimal separator in a single pass
+        standardized_value = cleaned_value.translate(_DECIMAL_COMMA_TABLE)
         try:
             return float(standardized_value)
         except (ValueError, TypeError):
@@ -54,10 +119,13 @@ def extract_price_tables_from_text(text):
                                norm_text: str,
                                headers: list[str],
                                start_pattern: re.Pattern,
-                               end_pattern: Optional[re.Pattern]):
-        logger.debug(f"--- Parsing Table (pattern): {start_pattern.pattern} ---")
+                               end_pattern: Optional[re.Pattern],
+                               anchor_at_start: bool = False):
+        if debug:
+            logger.debug(f"--- Parsing Table (pattern): {start_pattern.pattern} ---")
         try:
-            start_m = start_pattern.search(norm_text)
+            # When anchored, norm_text must start with the table marker
+            start_m = start_pattern.match(norm_text) if anchor_at_start else start_pattern.search(norm_text)
             if not start_m:
                 logger.warning(f"Start marker pattern not found: {start_pattern.pattern}")
                 return {}
@@ -72,7 +140,8 @@ def extract_price_tables_from_text(text):
             table_block = norm_text[start_idx:end_m.start()] if end_m else norm_text[start_idx:]
 
             lines = table_block.strip().split('\n')
-            logger.debug(f"Found {len(lines)} normalized lines for table pattern '{start_pattern.pattern}'.")
+            if debug:
+                logger.debug(f"Found {len(lines)} normalized lines for table pattern '{start_pattern.pattern}'.")
 
             # Normalize headers for matching
             norm_headers = [normalize_text(h) for h in headers]
@@ -82,14 +151,16 @@ def extract_price_tables_from_text(text):
             for i, line in enumerate(lines):
                 if all(h in line for h in norm_headers):
                     header_row_index = i
-                    logger.debug(f"Header row (1-line) at index {i}: '{line}'")
+                    if debug:
+                        logger.debug(f"Header row (1-line) at index {i}: '{line}'")
                     break
             if header_row_index == -1 and len(lines) >= 2:
                 for i in range(len(lines) - 1):
                     combined = (lines[i] + ' ' + lines[i + 1]).strip()
                     if all(h in combined for h in norm_headers):
                         header_row_index = i
-                        logger.debug(f"Header row (2-lines) starting at {i}: '{combined}'")
+                        if debug:
+                            logger.debug(f"Header row (2-lines) starting at {i}: '{combined}'")
                         break
 
             if header_row_index == -1:
@@ -97,30 +168,31 @@ def extract_price_tables_from_text(text):
                 return {}
 
             columns = {header: [] for header in headers}
-            data_lines = lines[header_row_index + 1:]
+            column_lists = [columns[header] for header in headers]
+            n_headers = len(headers)
+
+            # Prefer '|' as delimiter, else split on 2+ spaces; decided once per table block
+            split_line = _split_on_pipes if '|' in table_block else _TWO_SPACES_RX.split
+            strip = str.strip
 
-            for i, line in enumerate(data_lines):
-                # Prefer '|' as delimiter, else split on 2+ spaces
-                parts = [p.strip() for p in (line.split('|') if '|' in line else re.split(r'\s{2,}', line)) if p.strip()]
-                logger.debug(f"Line {i}: '{line}' -> Parsed parts: {parts}")
+            for i, line in enumerate(islice(lines, header_row_index + 1, None)):
+                parts = list(filter(None, map(strip, split_line(line))))
+                if debug:
+                    logger.debug(f"Line {i}: '{line}' -> Parsed parts: {parts}")
 
                 if not parts or (parts and all(c in '-–—' for c in parts[0])):
-                    logger.debug(f"Skipping separator or empty line: {parts}")
+                    if debug:
+                        logger.debug(f"Skipping separator or empty line: {parts}")
                     continue
 
-                for idx, header in enumerate(headers):
-                    if idx < len(parts):
-                        columns[header].append(clean_and_convert(parts[idx]))
-                    else:
-                        columns[header].append(None)
+                # Every row fills all columns (missing cells as None), so columns stay equally long
+                values = [clean_and_convert(p) for p in parts[:n_headers]]
+                values.extend([None] * (n_headers - len(values)))
+                for column, value in zip(column_lists, values):
+                    column.append(value)
 
-            if columns:
-                max_len = max((len(v) for v in columns.values()), default=0)
-                for header in headers:
-                    while len(columns[header]) < max_len:
-                        columns[header].append(None)
-
-            logger.debug(f"Final columns for pattern '{start_pattern.pattern}': {columns}")
+            if debug:
+                logger.debug(f"Final columns for pattern '{start_pattern.pattern}': {columns}")
             return columns
         except Exception as e:
             logger.error(f"An error occurred while parsing table (pattern '{start_pattern.pattern}'): {e}", exc_info=True)
@@ -138,7 +210,8 @@ def extract_price_tables_from_text(text):
             expanded_table['POTENCIA CONTRATADA'] = table_data['POTENCIA CONTRATADA']
         for i in range(1, 7):
             expanded_table[f'P{i}'] = price_values
-        logger.debug(f"Expanded UNICA table: {expanded_table}")
+        if debug:
+            logger.debug(f"Expanded UNICA table: {expanded_table}")
         return expanded_table
 
     def columns_to_tarifas(columns: dict) -> list:
@@ -147,46 +220,18 @@ def extract_price_tables_from_text(text):
         """
         if not columns:
             return []
-        # Determine number of rows by the longest column
-        max_len = 0
-        for v in columns.values():
-            try:
-                max_len = max(max_len, len(v))
-            except TypeError:
-                pass
-        tarifas = []
-        for i in range(max_len):
-            row = {
-                'tarifa': (columns.get('TARIFA', [None] * max_len)[i]
-                           if len(columns.get('TARIFA', [])) > i else None),
-                'potencia_contratada': (columns.get('POTENCIA CONTRATADA', [None] * max_len)[i]
-                                        if len(columns.get('POTENCIA CONTRATADA', [])) > i else None),
-                'P1': (columns.get('P1', [None] * max_len)[i]
-                       if len(columns.get('P1', [])) > i else None),
-                'P2': (columns.get('P2', [None] * max_len)[i]
-                       if len(columns.get('P2', [])) > i else None),
-                'P3': (columns.get('P3', [None] * max_len)[i]
-                       if len(columns.get('P3', [])) > i else None),
-                'P4': (columns.get('P4', [None] * max_len)[i]
-                       if len(columns.get('P4', [])) > i else None),
-                'P5': (columns.get('P5', [None] * max_len)[i]
-                       if len(columns.get('P5', [])) > i else None),
-                'P6': (columns.get('P6', [None] * max_len)[i]
-                       if len(columns.get('P6', [])) > i else None),
-            }
-            tarifas.append(row)
-        return tarifas
+        # Fetch each column once; missing columns are padded with None by zip_longest
+        cols = [columns.get(k) or () for k in _TARIFA_COLUMNS]
+        return [dict(zip(_TARIFA_KEYS, row)) for row in zip_longest(*cols, fillvalue=None)]
 
-    def find_title_line(orig_text: str, title_rx_norm: re.Pattern) -> Optional[str]:
+    def find_title_line(orig_lines: list[str], norm_lines: list[str], title_rx_norm: re.Pattern) -> Optional[str]:
         """Find the original title line whose normalized form matches title_rx_norm.
+        norm_lines[i] must be the normalized form of orig_lines[i].
         Returns the original line (preserving accents/case) or None.
         """
-        if not orig_text:
-            return None
-        lines = orig_text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
-        for line in lines:
-            norm_line = normalize_text(line)
-            if title_rx_norm.search(norm_line or ''):
+        for i, norm_line in enumerate(norm_lines):
+            if title_rx_norm.search(norm_line):
+                line = orig_lines[i]
                 # Clean up table formatting artifacts and duplicates
                 cleaned = line.strip().strip('#').strip('|').strip()
 
@@ -202,34 +247,22 @@ def extract_price_tables_from_text(text):
                 return cleaned if cleaned else None
         return None
 
-    def extract_tariff_name(orig_text: str) -> Optional[str]:
+    def extract_tariff_name(orig_lines: list[str], norm_lines: list[str]) -> Optional[str]:
         """Extract tariff name from document header (e.g., 'TARIFA CLÁSICA TE1').
+        norm_lines[i] must be the normalized form of orig_lines[i].
         Returns the tariff name or None if not found.
         """
-        if not orig_text:
-            return None
-        lines = orig_text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
-
         # Look for tariff patterns in the first 20 lines of the document
-        # Use more flexible patterns to handle accents and variations
-        tariff_patterns = [
-            re.compile(r'tarifa\s+cl[aá]sica\s+te\s*\d+', re.IGNORECASE),
-            re.compile(r'tarifa\s+te\s*\d+', re.IGNORECASE),
-            re.compile(r'cl[aá]sica\s+te\s*\d+', re.IGNORECASE),
-            # Also try without accents (normalized)
-            re.compile(r'tarifa\s+clasica\s+te\s*\d+', re.IGNORECASE)
-        ]
-
-        for i, line in enumerate(lines[:20]):  # Check first 20 lines
+        for i, line in enumerate(orig_lines[:20]):  # Check first 20 lines
             line_clean = line.strip()
             if not line_clean:
                 continue
 
             # Try both original and normalized versions
-            test_lines = [line_clean, normalize_text(line_clean)]
+            test_lines = [line_clean, norm_lines[i].strip()]
 
             for test_line in test_lines:
-                for pattern in tariff_patterns:
+                for pattern in _TARIFF_PATTERNS:
                     match = pattern.search(test_line)
                     if match:
                         # Return the original case version if found in original,
@@ -237,7 +270,7 @@ def extract_price_tables_from_text(text):
                         if test_line == line_clean:
                             return match.group(0).upper()
                         # Found in normalized, try to extract from original
-                        orig_match = re.search(r'tarifa.*te\s*\d+', line_clean, re.IGNORECASE)
+                        orig_match = _TARIFF_ORIG_RX.search(line_clean)
                         if orig_match:
                             return orig_match.group(0).upper()
                         return match.group(0).upper()
@@ -248,43 +281,39 @@ def extract_price_tables_from_text(text):
     clasica_base_headers = ['TARIFA', 'POTENCIA CONTRATADA', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6']
     unica_headers = ['TARIFA', 'POTENCIA CONTRATADA', 'P1 - P6']
 
-    # Build normalized text once
+    # Build normalized text and split it into lines once. Normalization never crosses line
+    # boundaries, so norm_lines[i] is the normalized form of orig_lines[i].
     norm = normalize_text(text)
+    orig_lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    norm_lines = norm.split('\n')
 
-    # Regex patterns tolerant to accents/spacing variants (applied on normalized text)
-    potencia_start_rx = re.compile(r"termino\s+de\s+potencia\s*\(\s*€/?\s*\/??\s*kw\s*y\s*dia\s*\)")
-    potencia_end_rx = re.compile(r"estos\s+precios\s+llevar?n?\s+incluidos")
-    potencia_title_rx = re.compile(r"precio\s+potencia\s*\(\s*€/?\s*kw\s*y\s*dia\s*\)")
-
-    # Match TE followed by any single digit (e.g., TE1, TE3)
-    clasica_base_start_rx = re.compile(r"precio\s+clasica\s+base\s+te\s*\d\s*\(\s*c€/?\s*kwh\s*\)")
-    clasica_base_end_rx = re.compile(r"precio\s+clasica\s+base\s+te\s*\d\s+unica")
-    clasica_base_title_rx = re.compile(r"precio\s+clasica\s+base\s+te\s*\d+\s*\(\s*c€/?\s*kwh\s*\)")
-
-    unica_start_rx = re.compile(r"precio\s+clasica\s+base\s+te\s*\d\s+unica\s*\(\s*c€/?\s*kwh\s*\)")
-    unica_end_rx = re.compile(r"en\s+caso\s+de\s+no\s+marcar\s+la\s+casilla")
-
-    potencia_data = parse_table_to_columns(text, norm, potencia_headers, potencia_start_rx, potencia_end_rx)
-    clasica_base_data = parse_table_to_columns(text, norm, clasica_base_headers, clasica_base_start_rx, clasica_base_end_rx)
+    potencia_data = parse_table_to_columns(text, norm, potencia_headers, _POTENCIA_START_RX, _POTENCIA_END_RX)
+    clasica_base_data = parse_table_to_columns(text, norm, clasica_base_headers, _CLASICA_BASE_START_RX, _CLASICA_BASE_END_RX)
 
-    # UNICA: prefer last occurrence
+    # UNICA: prefer last occurrence. Every match starts with the literal 'precio', so scan
+    # backwards for it and anchor the regex there instead of walking all matches
     last_unica_m = None
-    for match in unica_start_rx.finditer(norm):
-        last_unica_m = match
+    pos = norm.rfind('precio')
+    while pos != -1:
+        last_unica_m = _UNICA_START_RX.match(norm, pos)
+        if last_unica_m:
+            break
+        pos = norm.rfind('precio', 0, pos)
     unica_data_raw = {}
     if last_unica_m:
         unica_slice = norm[last_unica_m.start():]
         # Pass the slice as norm_text; orig_text still full text as parsing is normalization-based
-        unica_data_raw = parse_table_to_columns(text, unica_slice, unica_headers, re.compile(r"^" + unica_start_rx.pattern), unica_end_rx)
+        unica_data_raw = parse_table_to_columns(text, unica_slice, unica_headers, _UNICA_START_RX, _UNICA_END_RX,
+                                                anchor_at_start=True)
     else:
         logger.warning("Could not find any occurrence of the UNICA table marker (regex).")
 
     unica_data_expanded = expand_unica_table(unica_data_raw)
 
     # Detect dynamic titles from the document lines (fallback to defaults if not found)
-    titulo_potencia = find_title_line(text, potencia_title_rx) or 'PRECIO POTENCIA (€/kWdía)'
-    titulo_base = find_title_line(text, clasica_base_title_rx) or 'PRECIO CLÁSICA BASE TE3 (c€/kWh)'
-    titulo_unica = find_title_line(text, unica_start_rx) or 'PRECIO CLÁSICA BASE TE3 UNICA (c€/kWh)'
+    titulo_potencia = find_title_line(orig_lines, norm_lines, _POTENCIA_TITLE_RX) or 'PRECIO POTENCIA (€/kWdía)'
+    titulo_base = find_title_line(orig_lines, norm_lines, _CLASICA_BASE_TITLE_RX) or 'PRECIO CLÁSICA BASE TE3 (c€/kWh)'
+    titulo_unica = find_title_line(orig_lines, norm_lines, _UNICA_START_RX) or 'PRECIO CLÁSICA BASE TE3 UNICA (c€/kWh)'
 
     # Extract company name for filename - hardcoded to "Total Energies"
     company_name = "Total Energies"